@@ -1,5 +1,8 @@
 import sys
 import os
+import mmap
+import pathlib
+from collections import Counter
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog,
     QListWidget, QListWidgetItem, QLabel, QMenu, QMessageBox, QPlainTextEdit
@@ -15,20 +18,73 @@ def except_hook(cls, exception, traceback):
 sys.excepthook = except_hook
 
 def hex_to_bytes(hex_str):
-    return bytes(int(b, 16) for b in hex_str.strip().split())
+    return bytes.fromhex(hex_str)
 
-def read_rom_bytes(rom_path, offset, length):
-    with open(rom_path, 'rb') as f:
-        f.seek(offset)
-        return f.read(length)
+def format_bytes(data):
+    return data.hex(' ').upper()
+
+def append_patch(feature, patch):
+    if "offset" in patch and "original" in patch and "modified" in patch:
+        # Original/Modified never change, so format them once up front
+        patch["_orig_hex"] = format_bytes(patch["original"])
+        patch["_mod_hex"] = format_bytes(patch["modified"])
+        patch["_len"] = len(patch["modified"])
+        feature["patches"].append(patch)
+
+def parse_ini(path):
+    # Hack INIs repeat section names ("[#]") and Offset/Original/Modified keys,
+    # which configparser can't represent, so walk the lines once by hand
+    features = []
+    feature = {"name": "Feature", "description": "", "patches": []}
+    patch = {}
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
 
-def write_rom_bytes(rom_path, offset, data):
-    with open(rom_path, 'rb+') as f:
-        f.seek(offset)
-        f.write(data)
+            if line.startswith("[") and line.endswith("]"):
+                append_patch(feature, patch)
+                if feature["patches"]:
+                    features.append(feature)
+                feature = {"name": f"Feature {line[1:-1]}", "description": "", "patches": []}
+                patch = {}
+                continue
 
-def format_bytes(data):
-    return ' '.join(f"{b:02X}" for b in data)
+            key, sep, val = line.partition("=")
+            if not sep:
+                continue
+            key = key.strip().lower()
+            val = val.strip()
+
+            try:
+                if key == "name":
+                    feature["name"] = val
+                elif key in ("description", "hackdescription"):
+                    feature["description"] = val
+                elif key == "offset":
+                    append_patch(feature, patch)
+                    patch = {"offset": int(val, 16)}
+                elif key in ("original", "modified"):
+                    patch[key] = hex_to_bytes(val)
+            except ValueError as e:
+                raise ValueError(f"line {line_no}: {e}") from None
+
+    append_patch(feature, patch)
+    if feature["patches"]:
+        features.append(feature)
+
+    for patch_id, patch in enumerate(p for f in features for p in f["patches"]):
+        patch["id"] = patch_id
+    return features
+
+def patch_status(patch, current):
+    if current == patch["modified"]:
+        return "✅ mod"
+    if current == patch["original"]:
+        return "🔄 og"
+    return "⚠️ unk"
 
 class PatchTool(QWidget):
     def __init__(self):
@@ -38,7 +94,12 @@ class PatchTool(QWidget):
         self.resize(750, 600)
 
         self.rom_path = None
+        self.rom_data = None  # mmap of the ROM, or a bytearray copy if it can't be mapped
+        self._fd = None
+        self._dirty_runs = []  # (offset, length) written but not yet flushed
+        self.rom_writable = False
         self.features = []
+        self._status_cache = {}  # patch id -> status, dropped when the patch is written
 
         layout = QVBoxLayout()
 
@@ -68,6 +129,7 @@ class PatchTool(QWidget):
         self.feature_list = QListWidget()
         self.feature_list.setFont(QFont("Consolas", 10))
         self.feature_list.setMaximumHeight(250)
+        self.feature_list.setUniformItemSizes(True)
         self.feature_list.setStyleSheet("""
             QListWidget {
                 font-size: 12px;
@@ -106,9 +168,101 @@ class PatchTool(QWidget):
 
     def load_rom(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select ROM", "", "GBA ROMs (*.gba)")
-        if path:
-            self.rom_path = path
-            self.setWindowTitle(f"EpicEXE - {os.path.basename(path)}")
+        if not path:
+            return
+
+        # Open into locals so a failed load keeps the current ROM usable
+        fd = None
+        binary = getattr(os, "O_BINARY", 0)
+        try:
+            try:
+                fd = os.open(path, os.O_RDWR | binary)
+                access = mmap.ACCESS_WRITE
+            except PermissionError:
+                # Read-only ROMs can still be inspected, just not patched
+                fd = os.open(path, os.O_RDONLY | binary)
+                access = mmap.ACCESS_READ
+            try:
+                data = mmap.mmap(fd, 0, access=access)
+            except (OSError, ValueError):
+                # Some files can't be mapped (empty, network shares); keep an
+                # in-memory copy and write it back in flush_rom instead
+                os.close(fd)
+                fd = None
+                data = bytearray(pathlib.Path(path).read_bytes())
+        except OSError as e:
+            if fd is not None:
+                os.close(fd)
+            QMessageBox.warning(self, "Error", f"Could not open ROM: {e}")
+            return
+
+        try:
+            self.close_rom()
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not save previous ROM: {e}")
+        self._fd = fd
+        self.rom_data = data
+        self.rom_writable = access == mmap.ACCESS_WRITE
+        self.rom_path = path
+        self.setWindowTitle(f"EpicEXE - {os.path.basename(path)}")
+
+        if self.features:
+            row = self.feature_list.currentRow()
+            self.scan_patches()
+            self.populate_feature_list()
+            # Keep the detail panel in step with the new ROM's bytes
+            if row >= 0:
+                self.feature_list.setCurrentRow(row)
+                self.update_bottom_panel(row)
+            else:
+                self.detail_text.clear()
+
+    def close_rom(self):
+        # Tear down even if the final flush fails, then let the error surface
+        try:
+            if self.rom_data is not None:
+                self.flush_rom()
+        finally:
+            if isinstance(self.rom_data, mmap.mmap):
+                self.rom_data.close()
+            self.rom_data = None
+            self._dirty_runs = []
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self.rom_path = None
+
+    def write_rom_bytes(self, writes):
+        if not self.rom_writable:
+            raise PermissionError("ROM is read-only")
+        # Merge back-to-back (offset, data) pairs into one slice assignment
+        runs = []
+        for offset, data in sorted(writes, key=lambda w: w[0]):
+            if runs and runs[-1][0] + len(runs[-1][1]) == offset:
+                runs[-1][1] += data
+            else:
+                runs.append([offset, bytearray(data)])
+        # A bytearray would grow instead of failing like the mmap does
+        if any(offset + len(data) > len(self.rom_data) for offset, data in runs):
+            raise IndexError("patch runs past the end of the ROM")
+        for offset, data in runs:
+            self.rom_data[offset:offset + len(data)] = data
+            self._dirty_runs.append((offset, len(data)))
+        self.flush_rom()
+
+    def flush_rom(self):
+        if not self._dirty_runs:
+            return
+        if isinstance(self.rom_data, mmap.mmap):
+            self.rom_data.flush()
+        else:
+            # Patch the file in place; rewriting it whole would truncate the
+            # ROM if the write failed partway
+            with open(self.rom_path, "r+b") as f:
+                for offset, length in self._dirty_runs:
+                    f.seek(offset)
+                    f.write(self.rom_data[offset:offset + length])
+        self._dirty_runs = []
 
     def load_ini(self):
         if not self.rom_path:
@@ -119,76 +273,63 @@ class PatchTool(QWidget):
         if not path:
             return
 
-        with open(path, "r", encoding="utf-8") as f:
-            lines = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+        try:
+            features = parse_ini(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error", f"Could not load INI: {e}")
+            return
 
-        self.features = []
+        self.features = features
+        self.scan_patches()
+        self.populate_feature_list()
+
+    def scan_patches(self):
+        # One view over the ROM for the whole INI; released before the
+        # mapping can be closed
+        self._status_cache = {}
+        with memoryview(self.rom_data) as mv:
+            for feature in self.features:
+                for patch in feature["patches"]:
+                    offset = patch["offset"]
+                    current = bytes(mv[offset:offset + patch["_len"]])
+                    patch["_current"] = current
+                    self._status_cache[patch["id"]] = patch_status(patch, current)
+
+    def cached_status(self, patch):
+        status = self._status_cache.get(patch["id"])
+        if status is None:
+            status = self._status_cache[patch["id"]] = patch_status(patch, patch["_current"])
+        return status
+
+    def populate_feature_list(self):
+        # Suspend repaints and signals so the list only relays out once
+        self.feature_list.setUpdatesEnabled(False)
+        self.feature_list.blockSignals(True)
         self.feature_list.clear()
 
-        section_title = None
-        current_feature = {"patches": []}
+        font = QFont("Consolas", 10)
+        for index in range(len(self.features)):
+            item = QListWidgetItem(self.feature_label(index))
+            item.setFont(font)
+            item.setData(Qt.UserRole, index)
+            self.feature_list.addItem(item)
 
-        for line in lines:
-            if line.startswith("[") and line.endswith("]"):
-                if current_feature["patches"]:
-                    self.features.append(current_feature)
-                    self.add_feature_item(len(self.features) - 1)
-                section_title = line[1:-1]
-                current_feature = {"name": f"Feature {section_title}", "description": "", "patches": []}
-                continue
+        self.feature_list.blockSignals(False)
+        self.feature_list.setUpdatesEnabled(True)
 
-            if "=" in line:
-                key, val = line.split("=", 1)
-                key = key.strip().lower()
-                val = val.strip()
+    def refresh_feature_labels(self):
+        for row in range(self.feature_list.count()):
+            item = self.feature_list.item(row)
+            item.setText(self.feature_label(item.data(Qt.UserRole)))
 
-                if key == "name":
-                    current_feature["name"] = val
-                elif key in ("description", "hackdescription"):
-                    current_feature["description"] = val
-                elif key == "offset":
-                    if "offset" in current_feature:
-                        current_feature["patches"].append({
-                            "offset": current_feature.pop("offset"),
-                            "original": current_feature.pop("original"),
-                            "modified": current_feature.pop("modified")
-                        })
-                    current_feature["offset"] = int(val, 16)
-                elif key == "original":
-                    current_feature["original"] = hex_to_bytes(val)
-                elif key == "modified":
-                    current_feature["modified"] = hex_to_bytes(val)
-
-        if "offset" in current_feature and "original" in current_feature and "modified" in current_feature:
-            current_feature["patches"].append({
-                "offset": current_feature.pop("offset"),
-                "original": current_feature.pop("original"),
-                "modified": current_feature.pop("modified")
-            })
-        if current_feature["patches"]:
-            self.features.append(current_feature)
-            self.add_feature_item(len(self.features) - 1)
-
-    def add_feature_item(self, index):
+    def feature_label(self, index):
         feature = self.features[index]
-        statuses = []
-        for patch in feature["patches"]:
-            try:
-                current = read_rom_bytes(self.rom_path, patch["offset"], len(patch["modified"]))
-                if current == patch["modified"]:
-                    statuses.append("✅ mod")
-                elif current == patch["original"]:
-                    statuses.append("🔄 og")
-                else:
-                    statuses.append("⚠️ unk")
-            except Exception:
-                statuses.append("❌")
-        status = max(set(statuses), key=statuses.count)
-        display_line = f"📛 {feature['name']} – {feature['description']} [{status}]"
-        item = QListWidgetItem(display_line)
-        item.setFont(QFont("Consolas", 10))
-        item.setData(Qt.UserRole, index)
-        self.feature_list.addItem(item)
+        patches = feature["patches"]
+        status = self.cached_status(patches[0]) if patches else "❌"
+        # Only tally when the patches disagree; most features are all one status
+        if any(self.cached_status(patch) != status for patch in patches):
+            status = Counter(self.cached_status(patch) for patch in patches).most_common(1)[0][0]
+        return f"📛 {feature['name']} – {feature['description']} [{status}]"
 
     def update_bottom_panel_from_list(self, item):
         index = item.data(Qt.UserRole)
@@ -198,23 +339,16 @@ class PatchTool(QWidget):
         if index >= len(self.features):
             return
         feature = self.features[index]
-        text = f"📛 Feature: {feature['name']}\n📝 Description: {feature['description']}\n"
+        parts = [f"📛 Feature: {feature['name']}\n📝 Description: {feature['description']}\n"]
         for i, patch in enumerate(feature["patches"]):
-            try:
-                current = read_rom_bytes(self.rom_path, patch["offset"], len(patch["modified"]))
-                orig = format_bytes(patch["original"])
-                mod = format_bytes(patch["modified"])
-                exe = format_bytes(current)
-                text += (
-                    f"\n🧮 Patch {i + 1}\n"
-                    f"Offset: 0x{patch['offset']:06X}\n"
-                    f"Original:   {orig}\n"
-                    f"Modified:   {mod}\n"
-                    f"Executable: {exe}\n"
-                )
-            except Exception as e:
-                text += f"\n⚠️ Patch {i + 1} read error: {e}\n"
-        self.detail_text.setPlainText(text)
+            parts.append(
+                f"\n🧮 Patch {i + 1}\n"
+                f"Offset: 0x{patch['offset']:06X}\n"
+                f"Original:   {patch['_orig_hex']}\n"
+                f"Modified:   {patch['_mod_hex']}\n"
+                f"Executable: {format_bytes(patch['_current'])}\n"
+            )
+        self.detail_text.setPlainText("".join(parts))
 
     def show_context_menu(self, pos):
         item = self.feature_list.itemAt(pos)
@@ -231,15 +365,32 @@ class PatchTool(QWidget):
         action = menu.exec_(self.feature_list.viewport().mapToGlobal(pos))
 
         if action == mod_action:
-            for patch in feature["patches"]:
-                write_rom_bytes(self.rom_path, patch["offset"], patch["modified"])
+            field = "modified"
         elif action == orig_action:
-            for patch in feature["patches"]:
-                write_rom_bytes(self.rom_path, patch["offset"], patch["original"])
+            field = "original"
+        else:
+            return
 
-        self.add_feature_item(index)  # Refresh status
+        patches = feature["patches"]
+        try:
+            self.write_rom_bytes([(patch["offset"], patch[field]) for patch in patches])
+        except (IndexError, OSError) as e:
+            QMessageBox.warning(self, "Error", f"Could not write ROM: {e}")
+
+        # Rescan everything rather than assume patch[field]: patches overlap
+        # within and across features (alternative hacks share offsets), and
+        # Original/Modified can differ in length
+        self.scan_patches()
+        self.refresh_feature_labels()
         self.update_bottom_panel(index)
 
+    def closeEvent(self, event):
+        try:
+            self.close_rom()
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not save ROM: {e}")
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = PatchTool()